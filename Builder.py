@@ -1,16 +1,74 @@
 import subprocess
 import os
+import re
+import sys
+import shlex
+import errno
+import signal
+import asyncio
 import shutil
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# a command line with any of these has to go through the shell
+SHELL_CHARACTERS = set('|&;<>()$`*?[]{}~!\n')
+
+# so does one that starts with a variable assignment, FOO=1 cc ...
+ASSIGNMENT = re.compile(r'[A-Za-z_][A-Za-z0-9_]*=')
+
+# the size of the reads execute_async streams the output of a command with
+STREAM_CHUNK = 1 << 16
+
+# longer command lines are passed through a response file, Windows can't start anything above 32767
+MAX_COMMAND_LENGTH = 32000
 
 
 class Command:
-    def __init__(self, tool: str, arguments=None):
+    def __init__(self, tool: str, arguments=None, dependencies=None, inputs=None, outputs=None, timeout: float | None = None,
+                 sources=None, response_file=False):
         self.tool = tool
         self.arguments = arguments if arguments else []
+        self.dependencies = dependencies if dependencies else []
+
+        # the files a command processes one by one, they go after the arguments and
+        # commands that differ only in them can be batched into one invocation
+        self.sources = sources if sources else []
+
+        # whether the tool understands '@file' (gcc, clang, msvc and so on) for too long command lines
+        self.response_file = response_file
+
+        # seconds, only used by Builder.execute_async
+        self.timeout = timeout
+
+        # files the command reads and writes, a command with outputs can be cached
+        self.inputs = inputs if inputs else []
+        self.outputs = outputs if outputs else []
+
+    def __str__(self):
+        return f'{self.tool} {" ".join(self.arguments + self.sources)}'
+
+    def depends_on(self, *commands):
+        self.dependencies.extend(commands)
+
+    def add_input(self, path: str):
+        self.inputs.append(path)
+
+    def add_output(self, path: str):
+        self.outputs.append(path)
 
     def add_argument(self, argument: str):
         self.arguments.append(argument)
 
+    def add_source(self, path: str):
+        self.sources.append(path)
+
     def add_flag(self, flag: str, value: str | None = None, omit_equals=False):
         arg = '-' + flag
 
@@ -19,41 +77,559 @@ class Command:
 
         self.arguments.append(arg)
 
+    def needs_shell(self) -> bool:
+        line = str(self)
+        return any(c in SHELL_CHARACTERS for c in line) or ASSIGNMENT.match(line.lstrip()) is not None
+
     def combine(self, cmd):
         new_cmd = Command(self.tool)
 
-        new_cmd.arguments = self.arguments.copy()
+        new_cmd.arguments = self.arguments + self.sources
         new_cmd.arguments.extend(['&', cmd.tool])
-        new_cmd.arguments.extend(cmd.arguments.copy())
+        new_cmd.arguments.extend(cmd.arguments + cmd.sources)
 
         return new_cmd
 
 
+class BatchCommand(Command):
+    """Commands that differ only in their sources, run as one invocation of the tool."""
+
+    def __init__(self, members: list[Command]):
+        first = members[0]
+        timeouts = [m.timeout for m in members]
+
+        super().__init__(first.tool, first.arguments.copy(), first.dependencies.copy(),
+                         [path for m in members for path in m.inputs], [path for m in members for path in m.outputs],
+                         sum(timeouts) if None not in timeouts else None,
+                         [path for m in members for path in m.sources], first.response_file)
+
+        self.members = members
+
+
+@contextmanager
+def command_line(command: Command, max_length=MAX_COMMAND_LENGTH):
+    """Yields the command line of a command, moving the arguments into a response file when it's too long."""
+
+    line = str(command)
+
+    if len(line) <= max_length or not command.response_file or command.needs_shell():
+        yield line
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.rsp', text=True)
+
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(command.arguments + command.sources))
+
+        yield f'{command.tool} @{path}'
+    finally:
+        os.remove(path)
+
+
+class BuildCache:
+    """
+        Outputs of commands stored on disk under a key made of the command line and the hashes of its inputs.
+        The least recently used entries are evicted once the cache grows above max_size bytes.
+    """
+
+    INDEX = 'index.json'
+
+    def __init__(self, path='.build-cache', max_size=1 << 30):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.hashes = {}
+
+        os.makedirs(path, exist_ok=True)
+
+        try:
+            with open(f'{path}/{BuildCache.INDEX}', 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def hash_file(self, path: str) -> str:
+        stat = os.stat(path)
+        memo = (path, stat.st_mtime_ns, stat.st_size)
+
+        # the same file is often an input of many commands
+        if memo in self.hashes:
+            return self.hashes[memo]
+
+        self.hashes[memo] = hash_file(path)
+        return self.hashes[memo]
+
+    def key(self, command: Command) -> str | None:
+        """Returns the key of a command or None if it can't be cached."""
+
+        if not command.outputs:
+            return None
+
+        digest = hashlib.sha256(str(command).encode())
+
+        try:
+            for path in command.inputs:
+                digest.update(f'\0{path}\0{self.hash_file(path)}'.encode())
+        except OSError:
+            return None
+
+        for path in command.outputs:
+            digest.update(f'\0>{path}'.encode())
+
+        return digest.hexdigest()
+
+    def restore(self, key: str, outputs: list[str]) -> bool:
+        with self.lock:
+            if key not in self.entries:
+                return False
+
+            self.entries[key]['used'] = time.time()
+
+        try:
+            for i, path in enumerate(outputs):
+                create_parent_dirs(path)
+                shutil.copy2(f'{self.path}/{key}/{i}', path)
+        except OSError:
+            with self.lock:
+                self.entries.pop(key, None)
+
+            return False
+
+        return True
+
+    def store(self, key: str, outputs: list[str]):
+        if not all(os.path.isfile(path) for path in outputs):
+            return
+
+        # written under a temporary name, so a half-stored entry is never restored
+        temp = f'{self.path}/{key}.{threading.get_ident()}.tmp'
+        os.makedirs(temp, exist_ok=True)
+
+        for i, path in enumerate(outputs):
+            shutil.copy2(path, f'{temp}/{i}')
+
+        size = sum(os.path.getsize(path) for path in outputs)
+
+        with self.lock:
+            shutil.rmtree(f'{self.path}/{key}', ignore_errors=True)
+            os.replace(temp, f'{self.path}/{key}')
+
+            self.entries[key] = {'size': size, 'used': time.time()}
+            self._evict()
+
+    def _evict(self):
+        total = sum(entry['size'] for entry in self.entries.values())
+
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['used']):
+            if total <= self.max_size:
+                break
+
+            total -= self.entries.pop(key)['size']
+            shutil.rmtree(f'{self.path}/{key}', ignore_errors=True)
+
+    def save(self):
+        with self.lock:
+            with open(f'{self.path}/{BuildCache.INDEX}.tmp', 'w') as f:
+                json.dump(self.entries, f)
+
+            os.replace(f'{self.path}/{BuildCache.INDEX}.tmp', f'{self.path}/{BuildCache.INDEX}')
+
+
+class Result:
+    def __init__(self, command: Command | None, returncode: int, stdout: bytes, stderr: bytes, cached=False, timed_out=False):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.cached = cached
+        self.timed_out = timed_out
+
+        # results of the members of a failed batch that fail on their own
+        self.failures: list[Result] = []
+
+        # filled in by the scheduler, cpu_time and max_rss (bytes) only where the OS reports them.
+        # max_rss is an upper bound: the child counts the memory of the builder it was forked from
+        # until it executes the command, so it is never below the builder's own resident size
+        self.start = 0.0
+        self.wall_time = 0.0
+        self.cpu_time: float | None = None
+        self.max_rss: int | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
 class Builder:
     def __init__(self):
         self.commands = []
+        self.tasks = {}
 
     def add_command(self, command: Command):
         self.commands.append(command)
 
-    def execute(self, show_stdout=False, show_stderr=False, show_prompt=False, all_at_once=False):
-        def exec(prompt):
-            if show_prompt:
+    def batch(self, max_sources=64, max_length: int | None = None):
+        """
+            Replaces the commands that differ only in their sources with BatchCommands of up to max_sources
+            sources and max_length characters (MAX_COMMAND_LENGTH unless the tool takes response files).
+            When a batch fails, its members are run one by one and the failing ones end up in Result.failures.
+        """
+
+        if max_length is None:
+            max_length = MAX_COMMAND_LENGTH
+
+        groups = {}
+        batches = {}
+
+        for command in self.commands:
+            if not command.sources or command.needs_shell() or isinstance(command, BatchCommand):
+                continue
+
+            key = (command.tool, tuple(command.arguments), command.response_file, frozenset(map(id, command.dependencies)))
+            group = groups.setdefault(key, [[]])
+
+            sources = [path for member in group[-1] + [command] for path in member.sources]
+            too_long = not command.response_file and len(str(Command(command.tool, command.arguments, sources=sources))) > max_length
+
+            if group[-1] and (len(sources) > max_sources or too_long):
+                group.append([])
+
+            group[-1].append(command)
+
+        for group in groups.values():
+            for members in group:
+                if len(members) > 1:
+                    batch = BatchCommand(members)
+
+                    for member in members:
+                        batches[member] = batch
+
+        commands = []
+
+        for command in self.commands:
+            command = batches.get(command, command)
+
+            if command not in commands:
+                commands.append(command)
+
+        for command in commands:
+            command.dependencies = list(dict.fromkeys(batches.get(d, d) for d in command.dependencies))
+
+        self.commands = commands
+
+    def execute(self, show_stdout=False, show_stderr=False, show_prompt=False, all_at_once=False, jobs=1,
+                cache: BuildCache | None = None, show_report=False) -> list[Result]:
+        """
+            Runs the commands after their dependencies, up to `jobs` of them at once, and returns their results.
+            Nothing new is started after a command fails. The output of every command is printed
+            in one piece, so the output of concurrent commands doesn't interleave.
+            With a cache, the outputs of commands whose command line and inputs didn't change are restored
+            instead of running them. Every result records its wall time, CPU time and an upper bound of its peak RSS,
+            show_report prints the slowest commands and the critical path after the run.
+        """
+
+        lock = threading.Lock()
+
+        def exec(prompt, command=None) -> Result:
+            # sequential runs show the prompt before a command starts, concurrent ones along with its output
+            if show_prompt and jobs == 1:
                 print(prompt)
 
-            run = subprocess.run(prompt, capture_output=True, shell=True)
+            start = time.perf_counter()
+            returncode, stdout, stderr, usage = run_measured(prompt)
+
+            with lock:
+                if show_prompt and jobs != 1:
+                    print(prompt)
+
+                if show_stdout and len(stdout) > 0:
+                    print(stdout.decode(errors='ignore'))
+
+                if show_stderr and len(stderr) > 0:
+                    print(stderr.decode(errors='ignore'))
+
+            result = Result(command, returncode, stdout, stderr)
+            result.start, result.wall_time = start, time.perf_counter() - start
+
+            if usage is not None:
+                result.cpu_time = usage.ru_utime + usage.ru_stime
+                result.max_rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+            return result
+
+        def exec_cached(command: Command) -> Result:
+            start = time.perf_counter()
+            key = cache.key(command) if cache else None
 
-            if show_stdout and len(run.stdout) > 0:
-                print(run.stdout.decode(errors='ignore'))
+            if key is not None and cache.restore(key, command.outputs):
+                result = Result(command, 0, b'', b'', cached=True)
+                result.start, result.wall_time = start, time.perf_counter() - start
+                return result
 
-            if show_stderr and len(run.stderr) > 0:
-                print(run.stderr.decode(errors='ignore'))
+            with command_line(command) as line:
+                result = exec(line, command)
+
+            if isinstance(command, BatchCommand) and not result.ok:
+                # find out which of the sources are at fault
+                for member in command.members:
+                    with command_line(member) as line:
+                        if not (failure := exec(line, member)).ok:
+                            result.failures.append(failure)
+
+            if key is not None and result.ok:
+                cache.store(key, command.outputs)
+
+            return result
 
         if all_at_once:
-            exec(' & '.join([f'{c.tool} {" ".join(c.arguments)}' for c in self.commands]))
-        else:
-            for command in self.commands:
-                exec(f'{command.tool} {" ".join(command.arguments)}')
+            return [exec(' & '.join([str(c) for c in self.commands]))]
+
+        try:
+            results = self._schedule(exec_cached, jobs)
+        finally:
+            if cache:
+                cache.save()
+
+        if show_report:
+            print(report(results))
+
+        return results
+
+    async def execute_async(self, show_stdout=False, show_stderr=False, show_prompt=False, jobs=1,
+                            cache: BuildCache | None = None, show_report=False) -> list[Result]:
+        """
+            Same as execute, but runs the commands as asyncio subprocesses and streams their output
+            line by line with a '[<index>:<tool>]' prefix instead of buffering it, so Result.stdout
+            and Result.stderr stay empty. On POSIX commands without shell syntax are started without a shell.
+            A command is killed after its timeout, a running one can be stopped with cancel().
+            The event loop reaps the processes itself, so only the wall time of a command is recorded.
+            Use it as asyncio.run(builder.execute_async(...)).
+        """
+
+        def write(out, prefix: str, line: bytes):
+            out.write(prefix + line.decode(errors='ignore').rstrip('\r') + '\n')
+            out.flush()
+
+        async def stream(reader: asyncio.StreamReader, prefix: str, out, show: bool):
+            # read in chunks and split the lines here, readline() fails on a line longer than its limit
+            parts = []
+
+            while chunk := await reader.read(STREAM_CHUNK):
+                *lines, rest = chunk.split(b'\n')
+
+                if lines:
+                    lines[0] = b''.join(parts) + lines[0]
+                    parts = []
+
+                    if show:
+                        for line in lines:
+                            write(out, prefix, line)
+
+                if rest:
+                    parts.append(rest)
+
+            if parts and show:
+                write(out, prefix, b''.join(parts))
+
+        async def exec(command: Command) -> Result:
+            with command_line(command) as line:
+                return await exec_line(command, line)
+
+        async def exec_line(command: Command, line: str) -> Result:
+            index = self.commands.index(command) if command in self.commands else '*'
+            prefix = f'[{index}:{get_path_base(command.tool.split(" ")[0])}] '
+            # a separate process group, so a timeout also kills the children of a shell
+            pipes = {'stdout': asyncio.subprocess.PIPE, 'stderr': asyncio.subprocess.PIPE, 'start_new_session': os.name == 'posix'}
+
+            if show_prompt:
+                print(prefix + line, flush=True)
+
+            try:
+                # shlex splits the POSIX way and would drop the backslashes of C:\tools\gcc.exe,
+                # so elsewhere the shell parses the line like it does in execute
+                if command.needs_shell() or os.name != 'posix':
+                    process = await asyncio.create_subprocess_shell(line, **pipes)
+                else:
+                    process = await asyncio.create_subprocess_exec(*shlex.split(line), **pipes)
+            except OSError as e:
+                # a missing tool fails like it does in a shell, with 127
+                message = f'{prefix}{e}'
+
+                if show_stderr:
+                    print(message, file=sys.stderr, flush=True)
+
+                return Result(command, 127, b'', message.encode())
+
+            readers = asyncio.gather(
+                stream(process.stdout, prefix, sys.stdout, show_stdout),
+                stream(process.stderr, prefix, sys.stderr, show_stderr))
+
+            try:
+                await asyncio.wait_for(asyncio.shield(readers), command.timeout)
+                return Result(command, await process.wait(), b'', b'')
+            except asyncio.TimeoutError:
+                kill(process)
+                await process.wait()
+                await readers
+
+                print(f'{prefix}timed out after {command.timeout}s', file=sys.stderr, flush=True)
+                return Result(command, process.returncode, b'', b'', timed_out=True)
+            except asyncio.CancelledError:
+                kill(process)
+                await process.wait()
+                readers.cancel()
+                raise
+
+        async def exec_cached(command: Command) -> Result:
+            start = time.perf_counter()
+            key = await asyncio.to_thread(cache.key, command) if cache else None
+
+            if key is not None and await asyncio.to_thread(cache.restore, key, command.outputs):
+                result = Result(command, 0, b'', b'', cached=True)
+            else:
+                result = await exec(command)
+
+                if isinstance(command, BatchCommand) and not result.ok:
+                    # find out which of the sources are at fault
+                    for member in command.members:
+                        if not (failure := await exec(member)).ok:
+                            result.failures.append(failure)
+
+                if key is not None and result.ok:
+                    await asyncio.to_thread(cache.store, key, command.outputs)
+
+            result.start, result.wall_time = start, time.perf_counter() - start
+            return result
+
+        try:
+            results = await self._schedule_async(exec_cached, jobs)
+        finally:
+            if cache:
+                cache.save()
+
+        if show_report:
+            print(report(results))
+
+        return results
+
+    def cancel(self, command: Command) -> bool:
+        """Cancels a command running in execute_async, the build stops as if it failed."""
+
+        task = self.tasks.get(command)
+        return task is not None and task.cancel()
+
+    async def _schedule_async(self, run, jobs: int) -> list[Result]:
+        dependents = self._dependents()
+        remaining = {command: len(command.dependencies) for command in self.commands}
+        ready = deque(command for command in self.commands if remaining[command] == 0)
+
+        results = []
+        failed = False
+
+        try:
+            while True:
+                while ready and not failed and len(self.tasks) < jobs:
+                    command = ready.popleft()
+                    self.tasks[command] = asyncio.create_task(run(command))
+
+                if not self.tasks:
+                    break
+
+                done, _ = await asyncio.wait(self.tasks.values(), return_when=asyncio.FIRST_COMPLETED)
+
+                for command in [c for c, task in self.tasks.items() if task in done]:
+                    task = self.tasks.pop(command)
+                    result = Result(command, -1, b'', b'') if task.cancelled() else task.result()
+                    results.append(result)
+
+                    if not result.ok:
+                        failed = True
+                        continue
+
+                    for dependent in dependents[command]:
+                        remaining[dependent] -= 1
+
+                        if remaining[dependent] == 0:
+                            ready.append(dependent)
+        finally:
+            # the whole build was cancelled, don't leave the running commands behind
+            for task in self.tasks.values():
+                task.cancel()
+
+            if self.tasks:
+                await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+            self.tasks = {}
+
+        return results
+
+    def _dependents(self) -> dict[Command, list[Command]]:
+        dependents = {command: [] for command in self.commands}
+
+        for command in self.commands:
+            for dependency in command.dependencies:
+                if dependency not in dependents:
+                    raise ValueError(f'{command} depends on a command that was not added: {dependency}')
+
+                dependents[dependency].append(command)
+
+        # Kahn's algorithm, every command has to be reachable from the ones without dependencies
+        remaining = {command: len(command.dependencies) for command in self.commands}
+        ready = [command for command in self.commands if remaining[command] == 0]
+        visited = 0
+
+        while ready:
+            visited += 1
+
+            for dependent in dependents[ready.pop()]:
+                remaining[dependent] -= 1
+
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+
+        if visited != len(self.commands):
+            raise ValueError('the dependencies between the commands form a cycle')
+
+        return dependents
+
+    def _schedule(self, run, jobs: int) -> list[Result]:
+        dependents = self._dependents()
+        remaining = {command: len(command.dependencies) for command in self.commands}
+        ready = deque(command for command in self.commands if remaining[command] == 0)
+
+        results = []
+        failed = False
+
+        with ThreadPoolExecutor(jobs) as pool:
+            running = {}
+
+            while True:
+                while ready and not failed and len(running) < jobs:
+                    command = ready.popleft()
+                    running[pool.submit(run, command)] = command
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    command = running.pop(future)
+                    result = future.result()
+                    results.append(result)
+
+                    if not result.ok:
+                        failed = True
+                        continue
+
+                    for dependent in dependents[command]:
+                        remaining[dependent] -= 1
+
+                        if remaining[dependent] == 0:
+                            ready.append(dependent)
+
+        return results
 
 
 def is_dir(path: str) -> bool:
@@ -88,20 +664,146 @@ def get_files(path, is_local=True) -> list[str] | None:
 
     if not is_dir(full_path):
         return None
-    
-    files = []
 
-    for entry in os.listdir(full_path):
-        if is_file(f'{full_path}/{entry}', False):
-            files.append(entry)
-
-    return files
+    with os.scandir(full_path) as it:
+        return [entry.name for entry in it if entry.is_file()]
 
 
 def get_path_base(path: str):
     return os.path.basename(path)
 
 
+def run_measured(prompt: str) -> tuple[int, bytes, bytes, object | None]:
+    """Runs a shell command and returns its exit code, output and resource usage (None where wait4 is missing)."""
+
+    if not hasattr(os, 'wait4'):
+        run = subprocess.run(prompt, capture_output=True, shell=True)
+        return run.returncode, run.stdout, run.stderr, None
+
+    process = subprocess.Popen(prompt, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+
+    # stderr is read on a thread, so neither of the pipes fills up and blocks the child
+    stderr = []
+    reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()))
+    reader.start()
+
+    stdout = process.stdout.read()
+    reader.join()
+
+    process.stdout.close()
+    process.stderr.close()
+
+    # the child is reaped here instead of by Popen to get its resource usage
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    return process.returncode, stdout, stderr[0], usage
+
+
+def critical_path(results: list[Result]) -> tuple[float, list[Result]]:
+    """Returns the longest chain of dependent commands by wall time and its length in seconds."""
+
+    by_command = {result.command: result for result in results if result.command is not None}
+    finish = {}
+
+    def longest(command: Command) -> tuple[float, Result | None]:
+        # the finish time of a command along its longest chain and the dependency on that chain
+        if command not in finish:
+            before = max(((longest(d)[0], by_command[d]) for d in command.dependencies if d in by_command),
+                         key=lambda f: f[0], default=(0.0, None))
+            finish[command] = before[0] + by_command[command].wall_time, before[1]
+
+        return finish[command]
+
+    if not by_command:
+        return 0.0, []
+
+    last = max(by_command, key=lambda command: longest(command)[0])
+    path = [by_command[last]]
+
+    while (previous := finish[path[-1].command][1]) is not None:
+        path.append(previous)
+
+    return finish[last][0], path[::-1]
+
+
+def format_result(result: Result) -> str:
+    cpu = f'{result.cpu_time:8.2f}s' if result.cpu_time is not None else f'{"-":>9}'
+    rss = f'{result.max_rss / (1 << 20):9.1f} MiB' if result.max_rss is not None else f'{"-":>13}'
+    cached = ' (cached)' if result.cached else ''
+
+    return f'{result.wall_time:8.2f}s {cpu} {rss}  {result.command}{cached}'
+
+
+def report(results: list[Result], count=10) -> str:
+    """A summary of a build: the slowest commands and the critical path."""
+
+    if not results:
+        return 'build: no commands were run'
+
+    elapsed = max(r.start + r.wall_time for r in results) - min(r.start for r in results)
+    cpu = sum(r.cpu_time for r in results if r.cpu_time is not None)
+    failed = sum(not r.ok for r in results)
+
+    lines = [f'build: {len(results)} commands, {failed} failed, {elapsed:.2f}s wall, {cpu:.2f}s cpu',
+             f'slowest commands (rss <= is the peak RSS of a command or of the builder, whichever is larger):',
+             f'{"wall":>9} {"cpu":>9} {"rss <=":>13}']
+
+    for result in sorted(results, key=lambda r: r.wall_time, reverse=True)[:count]:
+        lines.append(format_result(result))
+
+    length, path = critical_path(results)
+
+    if len(path) > 1:
+        lines.append(f'critical path ({length:.2f}s):')
+        lines.extend(format_result(result) for result in path)
+
+    return '\n'.join(lines)
+
+
+def export_trace(results: list[Result], path: str):
+    """Writes the results as Chrome trace events, for chrome://tracing or Perfetto."""
+
+    origin = min((r.start for r in results), default=0.0)
+    lanes = []
+    events = []
+
+    for result in sorted(results, key=lambda r: r.start):
+        # concurrent commands go on separate rows of the viewer
+        lane = next((i for i, end in enumerate(lanes) if end <= result.start), len(lanes))
+
+        if lane == len(lanes):
+            lanes.append(0.0)
+
+        lanes[lane] = result.start + result.wall_time
+
+        events.append({
+            'name': str(result.command), 'cat': 'cached' if result.cached else 'command', 'ph': 'X',
+            'ts': (result.start - origin) * 1e6, 'dur': result.wall_time * 1e6, 'pid': 1, 'tid': lane,
+            'args': {'returncode': result.returncode, 'cpu_time': result.cpu_time, 'max_rss_upper_bound': result.max_rss}
+        })
+
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def kill(process: asyncio.subprocess.Process):
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+def create_parent_dirs(path: str):
+    parent = os.path.dirname(path)
+
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+
 def _copy(source: str, dest: str, is_source_local=True, is_dest_local=True, func=None):
     func(fix_path(source, is_source_local), fix_path(dest, is_dest_local))
 
@@ -112,3 +814,140 @@ def copy_file(source: str, dest: str, is_source_local=True, is_dest_local=True):
 
 def copy_dirs(source: str, dest: str, is_source_local=True, is_dest_local=True):
     _copy(source, dest, is_source_local, is_dest_local, os.rename)
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+# errors of the zero-copy calls that mean "not supported here", the copy falls back to the next method
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EPERM}
+
+
+def fast_copy(source: str, dest: str) -> int:
+    """
+        Copies a file with its metadata like shutil.copy2, through copy_file_range or sendfile where
+        the OS has them, so the data doesn't pass through user space. Returns the amount of copied bytes.
+    """
+
+    with open(source, 'rb') as fsrc, open(dest, 'wb') as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(infd).st_size
+        offset = 0
+
+        for method in ('copy_file_range', 'sendfile'):
+            if offset >= size or not hasattr(os, method):
+                continue
+
+            try:
+                os.lseek(outfd, offset, os.SEEK_SET)
+
+                while offset < size:
+                    if method == 'copy_file_range':
+                        sent = os.copy_file_range(infd, outfd, size - offset, offset)
+                    else:
+                        sent = os.sendfile(outfd, infd, offset, size - offset)
+
+                    if sent == 0:
+                        break
+
+                    offset += sent
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+
+        if offset < size:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst)
+            offset = size
+
+    shutil.copystat(source, dest)
+    return offset
+
+
+class SyncStats:
+    def __init__(self):
+        self.files_copied = 0
+        self.bytes_copied = 0
+        self.files_skipped = 0
+        self.bytes_skipped = 0
+
+    def __str__(self):
+        return (f'copied {self.files_copied} files ({self.bytes_copied} bytes), '
+                f'skipped {self.files_skipped} unchanged files ({self.bytes_skipped} bytes)')
+
+
+def is_unchanged(source: os.DirEntry, dest: str, use_hash=False) -> bool:
+    try:
+        stat = os.stat(dest)
+    except OSError:
+        return False
+
+    source_stat = source.stat()
+
+    if stat.st_size != source_stat.st_size:
+        return False
+
+    # copies keep the mtime of their source, so an equal one means the file wasn't changed since
+    if stat.st_mtime_ns == source_stat.st_mtime_ns:
+        return True
+
+    if use_hash and hash_file(source.path) == hash_file(dest):
+        # the next sync can skip it by mtime again
+        shutil.copystat(source.path, dest)
+        return True
+
+    return False
+
+
+def sync_tree(source: str, dest: str, is_source_local=True, is_dest_local=True, jobs=8, use_hash=False) -> SyncStats:
+    """
+        Copies the files of the source tree that differ from the ones in the destination by size or mtime
+        (or by content hash with use_hash) on `jobs` threads, and returns what was copied and skipped.
+    """
+
+    source, dest = fix_path(source, is_source_local), fix_path(dest, is_dest_local)
+    stats = SyncStats()
+    futures = []
+
+    with ThreadPoolExecutor(jobs) as pool:
+        stack = ['']
+
+        while stack:
+            relative = stack.pop()
+            os.makedirs(f'{dest}/{relative}' if relative else dest, exist_ok=True)
+
+            with os.scandir(f'{source}/{relative}' if relative else source) as it:
+                for entry in it:
+                    path = f'{relative}/{entry.name}' if relative else entry.name
+
+                    if entry.is_dir():
+                        stack.append(path)
+                    elif entry.is_file():
+                        futures.append(pool.submit(_sync_file, entry, f'{dest}/{path}', use_hash))
+
+        for future in futures:
+            copied, size = future.result()
+
+            if copied:
+                stats.files_copied += 1
+                stats.bytes_copied += size
+            else:
+                stats.files_skipped += 1
+                stats.bytes_skipped += size
+
+    return stats
+
+
+def _sync_file(source: os.DirEntry, dest: str, use_hash: bool) -> tuple[bool, int]:
+    if is_unchanged(source, dest, use_hash):
+        return False, source.stat().st_size
+
+    return True, fast_copy(source.path, dest)
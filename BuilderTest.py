@@ -0,0 +1,53 @@
+"""
+    Checks of Builder.execute_async.
+    Usage:
+        python BuilderTest.py
+"""
+
+import io
+import sys
+import asyncio
+import unittest
+from contextlib import redirect_stdout
+
+from Builder import Builder, Command
+
+
+def run_async(*commands: Command, **options):
+    builder = Builder()
+
+    for command in commands:
+        builder.add_command(command)
+
+    output = io.StringIO()
+
+    with redirect_stdout(output):
+        results = asyncio.run(builder.execute_async(**options))
+
+    return results, output.getvalue()
+
+
+class ExecuteAsyncTest(unittest.TestCase):
+    def test_long_line(self):
+        # far above the 64 KiB line limit of asyncio streams
+        command = Command(sys.executable, ['-c', '"print(\'x\' * 100000)"'])
+        results, output = run_async(command, show_stdout=True)
+
+        self.assertEqual(results[0].returncode, 0)
+        self.assertEqual(output, '[0:' + command.tool.split('/')[-1] + '] ' + 'x' * 100000 + '\n')
+
+    def test_missing_tool(self):
+        results, _ = run_async(Command('a-tool-that-does-not-exist'), Command(sys.executable, ['-c', 'pass']))
+
+        # the build stops at the failure instead of raising
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].returncode, 127)
+        self.assertIn(b'a-tool-that-does-not-exist', results[0].stderr)
+
+    def test_assignment_needs_shell(self):
+        self.assertTrue(Command('FOO=1', ['cc']).needs_shell())
+        self.assertFalse(Command('cc', ['-DFOO=1']).needs_shell())
+
+
+if __name__ == '__main__':
+    unittest.main()
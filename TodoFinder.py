@@ -2,22 +2,103 @@
     A small utility file that allows you to find TODOs in any directory or a file.
     Edit the TODO_BASE and FILE_FORMATS constants for your needs. You can use absolute and relative paths.
     Usage:
-        python todo.py [path]
+        python todo.py [path] [-j JOBS] [--ordered] [--index [FILE]] [--hash] [--changed-only]
+                       [--format text|jsonl|csv] [--summary] [--ignore PATTERN] [--no-ignore]
+                       [--max-depth N] [--max-size BYTES]
 """
 
 import sys
 import os
-from typing import Union
+import re
+import csv
+import json
+import codecs
+import mmap
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import IO, Iterator, NamedTuple, Union
 
 
 CPP_COMMENTS = [('//', '\n'), ('/*', '*/')]
 PY_COMMENTS = [('#', '\n'), ('"""', '"""')]
 
+# a quote can come with a lookbehind that has to hold for it to open a literal,
+# a ' right after a digit is a C++14 digit separator (1'000) and not a char literal
+CPP_STRINGS = ['"', ("'", r'(?<![0-9A-Fa-f])')]
+PY_STRINGS = ['"', "'", "'''"]
+
+Content = Union[str, bytes, mmap.mmap]
+
+
+class Scanner:
+    """
+        Finds all the comments of a language in one linear pass.
+        Comment and string delimiters are compiled into a single alternation, so whatever
+        begins first wins and comment delimiters inside string literals are skipped.
+    """
+
+    def __init__(self, comments: list[tuple[str, str]], strings: list[str | tuple[str, str]] = None):
+        self.comments = comments
+        self.strings = [(s, '') if isinstance(s, str) else s for s in strings] if strings else []
+
+        alternatives = []
+
+        for i, (begin, end) in enumerate(comments):
+            alternatives.append((begin, rf'{re.escape(begin)}(?P<c{i}>{Scanner._until(end)})(?:{re.escape(end)}|\Z)'))
+
+        for quote, guard in self.strings:
+            q = re.escape(quote)
+
+            if len(quote) == 1:
+                # a one-character quote can't span multiple lines
+                alternatives.append((quote, rf'{guard}{q}(?:[^\\\n{q}]|\\.)*{q}?'))
+            else:
+                alternatives.append((quote, rf'{guard}{q}{Scanner._until(quote, escapes=True)}(?:{q}|\Z)'))
+
+        # the longest delimiters go first so '"""' isn't taken for an empty string
+        alternatives.sort(key=lambda a: len(a[0]), reverse=True)
+        source = '|'.join(a for _, a in alternatives)
+
+        self.pattern = re.compile(source, re.DOTALL)
+        self.bytes_pattern = re.compile(source.encode(), re.DOTALL)
+
+    @staticmethod
+    def _until(end: str, escapes=False) -> str:
+        # an unrolled greedy loop instead of a lazy '.*?', it doesn't backtrack on every character
+        first, rest = re.escape(end[0]), re.escape(end[1:])
+        other = rf'[^{first}\\]*' if escapes else rf'[^{first}]*'
+        stop = rf'{first}(?!{rest})' if rest else None
+
+        if escapes:
+            return rf'{other}(?:(?:\\.|{stop}){other})*' if stop else rf'{other}(?:\\.{other})*'
+
+        return rf'{other}(?:{stop}{other})*' if stop else other
+
+    def scan(self, content: Content) -> Iterator[tuple[int, str, int, int]]:
+        """
+            Yields (offset, opening delimiter, body begin, body end) for every comment in the content.
+            Bytes and mmap objects are scanned in place, without decoding them.
+        """
+
+        pattern = self.pattern if isinstance(content, str) else self.bytes_pattern
+
+        for match in pattern.finditer(content):
+            group = match.lastgroup
+
+            if group is not None:
+                yield match.start(), self.comments[int(group[1:])][0], *match.span(group)
+
+
+CPP_SCANNER = Scanner(CPP_COMMENTS, CPP_STRINGS)
+PY_SCANNER = Scanner(PY_COMMENTS, PY_STRINGS)
+
 
 TODO_BASE = 'TODO:'
 FILE_FORMATS = {
-    'cpp': CPP_COMMENTS, 'hpp': CPP_COMMENTS,
-    'py': PY_COMMENTS
+    'cpp': CPP_SCANNER, 'hpp': CPP_SCANNER,
+    'py': PY_SCANNER
 }
 
 
@@ -34,54 +115,629 @@ def find_next_comment(content: str, comments: str, start=0):
             return index_begin, index_end
 
 
-def parse(path: str, comments) -> list[str]:
-    with open(path, 'r') as file:
-        content = ''.join(file.readlines())
+# the largest slice of a mapped file copied at once
+MMAP_BLOCK = 1 << 20
 
-    todos = []
-    start = 0
 
-    while indecies := find_next_comment(content, comments, start):
-        begin, todo_end = indecies
-        todo_begin = content.find(TODO_BASE, begin)
+class Todo(NamedTuple):
+    path: str
+    line: int
+    column: int
+    kind: str
+    text: str
+
+
+def _line_starts(content: Content, positions: Iterator[int]) -> Iterator[tuple[int, int]]:
+    # yields (line number, offset of the line start) for increasing positions, counting newlines
+    # only between neighbouring positions, so the content is walked once in total
+    newline = '\n' if isinstance(content, str) else b'\n'
+    line, line_start, last = 1, 0, 0
+
+    for position in positions:
+        if isinstance(content, mmap.mmap):
+            # mmap has no count(), so it's counted in bounded slices
+            count = sum(content[i:min(i + MMAP_BLOCK, position)].count(newline) for i in range(last, position, MMAP_BLOCK))
+        else:
+            count = content.count(newline, last, position)
 
-        if todo_begin != -1 and todo_begin < todo_end:
-            todo = content[todo_begin + len(TODO_BASE):todo_end+1].strip()
+        if count > 0:
+            line += count
+            line_start = content.rfind(newline, last, position) + 1
+
+        last = position
+
+        yield line, line_start
+
+
+def find_todos(content: Content, scanner) -> list[tuple[int, int, str, str]]:
+    """Returns (line, column, comment kind, text) of every TODO, lines and columns start from 1."""
+
+    todo_base = TODO_BASE if isinstance(content, str) else TODO_BASE.encode()
+    found = []
+
+    for _, kind, begin, end in scanner.scan(content):
+        todo_begin = content.find(todo_base, begin, end)
+
+        if todo_begin != -1:
+            # only the TODO itself is copied out of the content, and no more than a block of it,
+            # an unterminated block comment can run to the end of a huge file
+            todo = content[todo_begin + len(todo_base):min(end, todo_begin + len(todo_base) + MMAP_BLOCK)].strip()
 
             if len(todo) > 0:
-                todos.append(todo)
+                found.append((todo_begin, kind, todo if isinstance(todo, str) else todo.decode(errors='replace')))
+
+    todos = []
 
-        start = todo_end + 1
+    for (todo_begin, kind, text), (line, line_start) in zip(found, _line_starts(content, (f[0] for f in found))):
+        todos.append((line, _column(content, line_start, todo_begin), kind, text))
 
     return todos
 
 
-def search(path: str) -> Union[str, dict]:
-    name = os.path.basename(path)
+def _column(content: Content, line_start: int, position: int) -> int:
+    if isinstance(content, str):
+        return position - line_start + 1
+
+    # characters and not bytes, decoded a block at a time so a long minified line isn't copied whole,
+    # the incremental decoder keeps a character split between two blocks together
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    length = sum(len(decoder.decode(content[i:min(i + MMAP_BLOCK, position)])) for i in range(line_start, position, MMAP_BLOCK))
+
+    return length + len(decoder.decode(b'', final=True)) + 1
+
+
+# files smaller than that are cheaper to read than to map
+MMAP_THRESHOLD = 1 << 20
+
+
+def parse(path: str, scanner) -> list[Todo]:
+    with open(path, 'rb') as file:
+        try:
+            size = os.fstat(file.fileno()).st_size
+            content = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size >= MMAP_THRESHOLD else None
+        except (OSError, ValueError):
+            # pipes, special and some network files can't be mapped
+            content = None
+
+        if content is None:
+            return [Todo(path, *todo) for todo in find_todos(file.read(), scanner)]
+
+    with content:
+        return [Todo(path, *todo) for todo in find_todos(content, scanner)]
+
+
+def search(path: str) -> list[Todo]:
+    """Prints the TODOs of the path in the walk order and returns them."""
+
+    todos = []
+
+    for todo in scan(path, jobs=1, ordered=True):
+        print(f'{todo.path}: {todo.text}')
+        todos.append(todo)
+
+    return todos
+
+
+# number of files sent to a worker at once, keeps the pickling overhead low
+CHUNK_SIZE = 64
+
+INDEX_FILE = '.todo-index.json'
+
+
+def get_format(name: str) -> str:
+    # a leading dot marks a hidden file and not an extension
+    dot_index = name.find('.', 1)
+    return name[dot_index+1:] if dot_index != -1 else ''
+
+
+def translate(pattern: str) -> str:
+    """Translates a .gitignore glob into a regular expression."""
+
+    i, n, result = 0, len(pattern), []
+
+    while i < n:
+        c = pattern[i]
+
+        if pattern.startswith('**/', i):
+            # any amount of directories, including none
+            result.append('(?:.*/)?')
+            i += 3
+            continue
+
+        if pattern.startswith('**', i):
+            result.append('.*')
+            i += 2
+            continue
+
+        if c == '*':
+            result.append('[^/]*')
+        elif c == '?':
+            result.append('[^/]')
+        elif c == '\\' and i + 1 < n:
+            result.append(re.escape(pattern[i + 1]))
+            i += 1
+        elif c == '[' and (end := pattern.find(']', i + 2)) != -1:
+            body = pattern[i + 1:end].replace('\\', '\\\\')
+            result.append('[' + ('^' + body[1:] if body[0] in '!^' else body) + ']')
+            i = end
+        else:
+            result.append(re.escape(c))
+
+        i += 1
+
+    return ''.join(result)
+
+
+class IgnoreRules:
+    """
+        .gitignore-style patterns, relative to the directory they were read from.
+        Neighbouring patterns of the same kind are compiled into one regex, the last matching group wins.
+    """
+
+    def __init__(self, patterns: list[str]):
+        groups = []
+
+        for line in patterns:
+            line = line.rstrip()
+
+            if not line or line.startswith('#'):
+                continue
+
+            negate = line.startswith('!')
+            line = line[1:] if negate else line
+
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+
+            # a pattern with a slash is relative to the directory, otherwise it matches at any depth
+            regex = translate(line.lstrip('/')) if '/' in line else '(?:.*/)?' + translate(line)
+
+            if groups and groups[-1][0] == (negate, dir_only):
+                groups[-1][1].append(regex)
+            else:
+                groups.append(((negate, dir_only), [regex]))
+
+        self.groups = [(negate, dir_only, re.compile('|'.join(f'(?:{r})' for r in regexes) + r'\Z'))
+                       for (negate, dir_only), regexes in reversed(groups)]
+
+    @staticmethod
+    def read(path: str) -> 'IgnoreRules':
+        with open(path, 'r', errors='replace') as file:
+            return IgnoreRules(file.read().splitlines())
+
+    def match(self, path: str, is_dir: bool) -> bool | None:
+        """Returns True for an ignored path, False for an explicitly included one and None otherwise."""
+
+        for negate, dir_only, pattern in self.groups:
+            if (is_dir or not dir_only) and pattern.match(path):
+                return not negate
+
+        return None
+
+
+DEFAULT_IGNORES = ['.git/', '.hg/', '.svn/', 'node_modules/', '__pycache__/', '.venv/', 'venv/', '.tox/', 'build/', 'dist/']
+GITIGNORE = '.gitignore'
+
+
+class Pruner:
+    """Decides which entries of a walk are skipped and counts them."""
+
+    def __init__(self, patterns: list[str] = None, gitignore=True, max_depth: int | None = None, max_size: int | None = None):
+        self.rules = IgnoreRules(DEFAULT_IGNORES if patterns is None else patterns)
+        self.gitignore = gitignore
+        self.max_depth = max_depth
+        self.max_size = max_size
+        self.pruned = {'directories': 0, 'files': 0, 'depth': 0, 'size': 0}
+
+    def is_ignored(self, chain: tuple, path: str, is_dir: bool) -> bool:
+        # the deepest rules take precedence
+        for base, rules in reversed(chain):
+            ignored = rules.match(path[len(base) + 1:], is_dir)
+
+            if ignored is not None:
+                return ignored
+
+        return False
+
+    def is_too_large(self, entry: os.DirEntry) -> bool:
+        return self.max_size is not None and entry.stat().st_size > self.max_size
+
+
+def walk(path: str, ordered=False, pruner: Pruner | None = None) -> Iterator[str]:
+    if not os.path.isdir(path):
+        if get_format(os.path.basename(path)) in FILE_FORMATS:
+            yield path
+        return
+
+    pruned = pruner.pruned if pruner else None
+    stack = [(path, 0, ((path, pruner.rules),) if pruner else ())]
+
+    while stack:
+        directory, depth, chain = stack.pop()
+
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        if ordered:
+            entries.sort(key=lambda e: e.name)
+
+        if pruner and pruner.gitignore and any(e.name == GITIGNORE for e in entries):
+            try:
+                chain += ((directory, IgnoreRules.read(f'{directory}/{GITIGNORE}')),)
+            except OSError:
+                pass
+
+        dirs = []
 
-    if os.path.isdir(path):
-        for entry in os.listdir(path):
-            search(f'{path}/{entry}')
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    entry_path = entry.path.replace('\\', '/')
+
+                    # whole subtrees are dropped before they are listed
+                    if pruner and pruner.max_depth is not None and depth >= pruner.max_depth:
+                        pruned['depth'] += 1
+                    elif pruner and pruner.is_ignored(chain, entry_path, True):
+                        pruned['directories'] += 1
+                    else:
+                        dirs.append((entry_path, depth + 1, chain))
+                elif entry.is_file() and get_format(entry.name) in FILE_FORMATS:
+                    entry_path = entry.path.replace('\\', '/')
+
+                    if pruner and pruner.is_ignored(chain, entry_path, False):
+                        pruned['files'] += 1
+                    elif pruner and pruner.is_too_large(entry):
+                        pruned['size'] += 1
+                    else:
+                        yield entry_path
+            except OSError:
+                continue
+
+        # reversed so the stack pops subdirectories in alphabetical order
+        stack.extend(reversed(dirs))
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(path, 'rb') as file:
+        while block := file.read(1 << 20):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class Index:
+    """
+        Persistent per-file TODO results keyed by path, mtime and size (and optionally a content hash),
+        so repeated runs only parse the files that changed since the previous one.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: str, use_hash=False):
+        self.path = path
+        self.use_hash = use_hash
+        self.files = {}
+        self.seen = set()
+
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if data.get('version') == Index.VERSION:
+            self.files = data['files']
+
+    def check(self, path: str) -> list[Todo] | None:
+        """Returns the cached TODOs of an unchanged file or None if it has to be parsed."""
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        self.seen.add(path)
+        entry = self.files.get(path)
+
+        if entry is not None and entry['size'] == stat.st_size:
+            if entry['mtime'] == stat.st_mtime_ns:
+                return [Todo(path, *todo) for todo in entry['todos']]
+
+            # the file was touched, but its content may still be the same
+            if self.use_hash and entry.get('hash') is not None:
+                try:
+                    if file_digest(path) == entry['hash']:
+                        entry['mtime'] = stat.st_mtime_ns
+                        return [Todo(path, *todo) for todo in entry['todos']]
+                except OSError:
+                    pass
+
+        self.files.pop(path, None)
+
+        return None
+
+    def update(self, path: str, todos: list[Todo], digest: str | None = None):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+
+        # the path is the key already, so it isn't stored with every TODO
+        self.files[path] = {
+            'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest,
+            'todos': [todo[1:] for todo in todos]
+        }
+
+    def evict(self, root: str):
+        """Drops the entries of the files under the root that weren't seen by the last walk."""
+
+        prefix = root.rstrip('/') + '/'
+
+        for path in [p for p in self.files if p not in self.seen and (p == root or p.startswith(prefix))]:
+            del self.files[path]
+
+    def save(self):
+        temp = f'{self.path}.tmp'
+
+        with open(temp, 'w') as file:
+            json.dump({'version': Index.VERSION, 'files': self.files}, file, separators=(',', ':'))
+
+        os.replace(temp, self.path)
+
+
+def parse_chunk(paths: list[str], use_hash=False) -> list[tuple[str, list[Todo], str | None]]:
+    results = []
+
+    for path in paths:
+        try:
+            todos = parse(path, FILE_FORMATS[get_format(os.path.basename(path))])
+            digest = file_digest(path) if use_hash else None
+        except OSError:
+            continue
+
+        results.append((path, todos, digest))
+
+    return results
+
+
+def chunks(paths: Iterator[str], size: int) -> Iterator[list[str]]:
+    chunk = []
+
+    for path in paths:
+        chunk.append(path)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def plan(paths: Iterator[str], index: Index | None, changed_only=False) -> Iterator[tuple[bool, list]]:
+    """
+        Splits the walk into (False, paths to parse) chunks and (True, cached results) chunks,
+        keeping the walk order between them.
+    """
+
+    if index is None:
+        for chunk in chunks(paths, CHUNK_SIZE):
+            yield False, chunk
+        return
+
+    cached, stale = [], []
+
+    for path in paths:
+        todos = index.check(path)
+
+        if todos is None:
+            if cached:
+                yield True, cached
+                cached = []
+
+            stale.append(path)
+        elif not changed_only:
+            if stale:
+                yield False, stale
+                stale = []
+
+            cached.append((path, todos, None))
+
+        if len(stale) == CHUNK_SIZE:
+            yield False, stale
+            stale = []
+        elif len(cached) == CHUNK_SIZE:
+            yield True, cached
+            cached = []
+
+    if cached:
+        yield True, cached
+
+    if stale:
+        yield False, stale
+
+
+def scan(path: str, jobs: int | None = None, ordered=False,
+         index: Index | None = None, changed_only=False, pruner: Pruner | None = None) -> Iterator[Todo]:
+    """
+        Walks the path and parses the files in a process pool, yielding Todo records
+        as soon as they are found. With ordered=True the results follow the sorted walk order.
+        With an index, unchanged files are served from it and changed_only=True skips them entirely.
+        A pruner skips ignored, too deep and too large entries of the walk.
+    """
+
+    jobs = jobs or os.cpu_count() or 1
+    use_hash = index is not None and index.use_hash
+    tasks = plan(walk(path, ordered, pruner), index, changed_only)
+
+    if jobs == 1:
+        for is_cached, chunk in tasks:
+            yield from _results(chunk if is_cached else parse_chunk(chunk, use_hash), index, is_cached)
+    else:
+        # limit the amount of chunks in flight so the walk is not buffered entirely in memory
+        max_pending = jobs * 4
+
+        with ProcessPoolExecutor(jobs) as pool:
+            pending = deque()
+
+            for is_cached, chunk in tasks:
+                if is_cached:
+                    future = Future()
+                    future.set_result(chunk)
+                else:
+                    future = pool.submit(parse_chunk, chunk, use_hash)
+
+                pending.append((future, is_cached))
+
+                while len(pending) >= max_pending:
+                    yield from _collect(pending, ordered, index)
+
+            while pending:
+                yield from _collect(pending, ordered, index)
+
+    if index is not None:
+        index.evict(path)
+        index.save()
+
+
+def _collect(pending: deque, ordered: bool, index: Index | None) -> Iterator[Todo]:
+    if ordered:
+        done = [pending.popleft()]
+    else:
+        futures, _ = wait([future for future, _ in pending], return_when=FIRST_COMPLETED)
+        done = [task for task in pending if task[0] in futures]
+
+        for task in done:
+            pending.remove(task)
+
+    for future, is_cached in done:
+        yield from _results(future.result(), index, is_cached)
+
+
+def _results(results: list, index: Index | None, is_cached: bool) -> Iterator[Todo]:
+    for file, todos, digest in results:
+        if index is not None and not is_cached:
+            index.update(file, todos, digest)
+
+        yield from todos
+
+
+class Summary:
+    """TODO counts of every directory under the root, including its subdirectories, gathered from a stream."""
+
+    def __init__(self, root: str, pruner: Pruner | None = None):
+        self.root = root.rstrip('/')
+        self.counts = {}
+        self.pruner = pruner
+
+    def add(self, todo: Todo):
+        directory = os.path.dirname(todo.path)
+
+        while True:
+            self.counts[directory] = self.counts.get(directory, 0) + 1
+
+            if len(directory) <= len(self.root):
+                break
+
+            directory = os.path.dirname(directory)
+
+    def track(self, todos: Iterator[Todo]) -> Iterator[Todo]:
+        for todo in todos:
+            self.add(todo)
+            yield todo
+
+
+def write_text(todos: Iterator[Todo], out: IO[str]):
+    for todo in todos:
+        out.write(f'{todo.path}: {todo.text}\n')
+        out.flush()
+
+
+def write_jsonl(todos: Iterator[Todo], out: IO[str]):
+    for todo in todos:
+        out.write(json.dumps(todo._asdict()) + '\n')
+        out.flush()
+
+
+def write_csv(todos: Iterator[Todo], out: IO[str]):
+    writer = csv.writer(out)
+    writer.writerow(Todo._fields)
+
+    for todo in todos:
+        writer.writerow(todo)
+        out.flush()
+
+
+def write_summary(summary: Summary, format: str, out: IO[str]):
+    counts = sorted(summary.counts.items())
+    pruned = summary.pruner.pruned if summary.pruner else None
+
+    if format == 'jsonl':
+        for directory, count in counts:
+            out.write(json.dumps({'directory': directory, 'todos': count}) + '\n')
+
+        if pruned:
+            out.write(json.dumps({'pruned': pruned}) + '\n')
+    elif format == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(('directory', 'todos'))
+        writer.writerows(counts)
+
+        if pruned:
+            writer.writerow(('pruned', 'count'))
+            writer.writerows(pruned.items())
     else:
-        dot_index = name.find('.')
+        for directory, count in counts:
+            out.write(f'{directory}: {count}\n')
 
-        if dot_index == 0:
-            dot_index = name.find('.')
+        if pruned:
+            out.write(f'pruned: {pruned["directories"]} ignored directories, {pruned["files"]} ignored files, '
+                      f'{pruned["depth"]} directories too deep, {pruned["size"]} files too large\n')
 
-        if dot_index == -1 and FILE_FORMATS.count('') > 0 or dot_index >= 0:
-            if dot_index < len(name) - 1:
-                format = name[dot_index+1:]
 
-                if format in FILE_FORMATS:
-                    for todo in parse(path, FILE_FORMATS[format]):
-                        print(f'{path}: {todo}')
+WRITERS = {'text': write_text, 'jsonl': write_jsonl, 'csv': write_csv}
 
 
 def main(args: list[str]):
-    assert len(args) == 2, "No path was provided"
-    assert os.path.exists(args[1]), "Path doesn't exist"
+    parser = argparse.ArgumentParser(prog=os.path.basename(args[0]))
+    parser.add_argument('path')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: CPU count)')
+    parser.add_argument('--ordered', action='store_true', help='print results in a deterministic order')
+    parser.add_argument('--index', nargs='?', const=INDEX_FILE, default=None,
+                        help=f'reuse the results of unchanged files from an index file (default: {INDEX_FILE})')
+    parser.add_argument('--hash', action='store_true', help='compare content hashes of touched files in the index')
+    parser.add_argument('--changed-only', action='store_true', help='only print the TODOs of files changed since the last indexed run')
+    parser.add_argument('--format', choices=WRITERS, default='text', help='output format (default: text)')
+    parser.add_argument('--summary', action='store_true', help='write TODO counts per directory and pruned entries to stderr at the end')
+    parser.add_argument('--ignore', action='append', default=[], metavar='PATTERN', help='an extra .gitignore-style pattern to skip')
+    parser.add_argument('--no-ignore', action='store_true', help="don't skip the default directories and don't read .gitignore files")
+    parser.add_argument('--max-depth', type=int, default=None, help='the deepest directory level to descend into')
+    parser.add_argument('--max-size', type=int, default=None, help='skip files larger than that many bytes')
+    options = parser.parse_args(args[1:])
+
+    assert os.path.exists(options.path), "Path doesn't exist"
+    assert options.jobs is None or options.jobs > 0, "Number of jobs must be positive"
+
+    if options.changed_only and options.index is None:
+        options.index = INDEX_FILE
+
+    path = os.path.abspath(options.path).replace('\\', '/')
+    index = Index(options.index, options.hash) if options.index else None
+    pruner = Pruner(options.ignore if options.no_ignore else DEFAULT_IGNORES + options.ignore,
+                    not options.no_ignore, options.max_depth, options.max_size)
+    todos = scan(path, options.jobs, options.ordered, index, options.changed_only, pruner)
+
+    summary = Summary(path if os.path.isdir(path) else os.path.dirname(path), pruner) if options.summary else None
+
+    WRITERS[options.format](summary.track(todos) if summary else todos, sys.stdout)
 
-    search(os.path.abspath(args[1]).replace('\\', '/'))
+    if summary:
+        write_summary(summary, options.format, sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+"""
+    Compares the single-pass Scanner with the old find_next_comment loop on synthetic sources.
+    Usage:
+        python TodoFinderBench.py [lines]
+"""
+
+import sys
+import timeit
+from typing import Iterator
+
+from TodoFinder import CPP_COMMENTS, CPP_SCANNER, PY_COMMENTS, PY_SCANNER, Content, find_next_comment, find_todos
+
+
+class LegacyScanner:
+    """The find_next_comment loop behind the Scanner interface, kept for comparison."""
+
+    def __init__(self, comments: list[tuple[str, str]]):
+        self.comments = comments
+
+    def scan(self, content: Content) -> Iterator[tuple[int, str, int, int]]:
+        comments = self.comments
+
+        if not isinstance(content, str):
+            comments = [(begin.encode(), end.encode()) for begin, end in comments]
+
+        start = 0
+
+        while indecies := find_next_comment(content, comments, start):
+            begin, end = indecies
+            kind = next(b for b, _ in comments if content.startswith(b, begin))
+
+            yield begin, kind if isinstance(kind, str) else kind.decode(), begin + len(kind), end + 1
+            start = end + 1
+
+
+def make_cpp(lines: int) -> str:
+    # block comments only, so the legacy loop searches for '//' through the whole rest of the file every time
+    chunk = [
+        'int value = compute(1, 2); /* TODO: check the overflow */\n',
+        'const char* text = "/* not a comment */";\n',
+        '/* a regular comment */\n',
+        'return value;\n'
+    ]
+
+    return ''.join(chunk[i % len(chunk)] for i in range(lines))
+
+
+def make_py(lines: int) -> str:
+    chunk = [
+        'value = compute(1, 2)  # TODO: check the overflow\n',
+        'text = "# not a comment"\n',
+        '"""TODO: a docstring"""\n',
+        'return value\n'
+    ]
+
+    return ''.join(chunk[i % len(chunk)] for i in range(lines))
+
+
+def bench(name: str, content: str, scanner, legacy, repeat=3):
+    for title, s in (('scanner', scanner), ('legacy', legacy)):
+        found = len(find_todos(content, s))
+        elapsed = min(timeit.repeat(lambda: find_todos(content, s), number=1, repeat=repeat))
+        print(f'{name:>4} {title:>8}: {elapsed * 1000:9.2f} ms, {found} TODOs')
+
+
+def main(args: list[str]):
+    lines = int(args[1]) if len(args) > 1 else 10000
+
+    bench('cpp', make_cpp(lines), CPP_SCANNER, LegacyScanner(CPP_COMMENTS))
+    bench('py', make_py(lines), PY_SCANNER, LegacyScanner(PY_COMMENTS))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,87 @@
+# Compare the original STR counting loop with longest_runs
+
+import sys
+import glob
+import time
+from csv import reader
+
+from dna import read_sequence, longest_runs
+
+
+def read_strs(filename):
+    # extract the sequences from the header of the database into a list
+    with open(filename) as people_file:
+        for row in reader(people_file):
+            return row[1:]
+
+    return []
+
+
+def legacy_runs(dna, keys):
+    # the original counting loop of dna.py
+    sequences = {}
+
+    # copy the list in a dictionary where the genes are the keys
+    for item in keys:
+        sequences[item] = 1
+
+    # iterate trough the dna sequence, when it finds repetitions of the values from sequence dictionary it counts them
+    for key in sequences:
+        temp, temp_max, l = 0, 0, len(key)
+
+        for i in range(len(dna)):
+
+            # after having counted a sequence it skips at the end of it to avoid counting again
+            while temp > 0:
+                temp -= 1
+                continue
+
+            # if the segment of dna corresponds to the key and there is a repetition of it we start counting
+            if dna[i: i + l] == key:
+                while dna[i - l: i] == dna[i: i + l]:
+                    temp += 1
+                    i += l
+
+                # it compares the value to the previous longest sequence and if it is longer it overrides it
+                if temp > temp_max:
+                    temp_max = temp
+
+        # store the longest sequences in the dictionary using the correspondent key
+        sequences[key] += temp_max
+
+    return sequences
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python benchmark.py DATABASE [REPEAT]")
+
+    keys = read_strs(sys.argv[1])
+    repeat = int(sys.argv[2]) if len(sys.argv) == 3 else 1
+
+    legacy_time = runs_time = 0
+
+    for filename in sorted(glob.glob("sequences/*.txt")):
+        # a longer sample made of the same sequence several times over
+        dna = read_sequence(filename) * repeat
+
+        legacy, elapsed = timed(legacy_runs, dna, keys)
+        legacy_time += elapsed
+        runs, elapsed = timed(longest_runs, dna, keys)
+        runs_time += elapsed
+
+        # the original loop counts a sequence that doesn't occur at all as 1
+        if any(legacy[key] != max(runs[key], 1) for key in keys):
+            sys.exit(f"The counts for {filename} don't match")
+
+    print(f"legacy {legacy_time:.3f}s, longest_runs {runs_time:.4f}s, {legacy_time / runs_time:.0f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Compare the csv scan with lookups in the compiled database
+
+import os
+import sys
+import csv
+import time
+import random
+import tempfile
+
+from dna import Database
+
+
+def find_person(filename, sequences):
+    # the original scan of dna.py: iterate trough the database of people treating each one like a dictionary
+    with open(filename, newline="") as people_file:
+        for person in csv.DictReader(people_file):
+
+            # compares the sequences to every person and returns the name of the first match
+            match = sum(sequences[dna] == int(person[dna]) for dna in sequences)
+
+            if match == len(sequences):
+                return person["name"]
+
+    return None
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) > 2:
+        sys.exit("Usage: python database_benchmark.py [PEOPLE]")
+
+    people = int(sys.argv[1]) if len(sys.argv) == 2 else 1000000
+    strs = ["AGATC", "TTTTTTCT", "AATG", "TCTAG", "GATA", "TATC", "GAAA", "TCTG"]
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "people.csv")
+
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name"] + strs)
+            for person in range(people):
+                writer.writerow([f"person{person}"] + [rng.randrange(1, 60) for _ in strs])
+
+        # the last person is the worst case for the scan
+        with open(filename, newline="") as f:
+            last = list(csv.DictReader(f))[-1]
+        sequences = {key: int(last[key]) for key in strs}
+
+        database, compile_time = timed(Database.open, filename)
+        database.close()
+        database, open_time = timed(Database.open, filename)
+
+        scanned, scan_time = timed(find_person, filename, sequences)
+        found, find_time = timed(database.find, sequences.values())
+        database.close()
+
+        print(f"{people} people: compile {compile_time:.2f}s, reopen {open_time * 1000:.2f}ms")
+        print(f"csv scan {scan_time:.3f}s, lookup {find_time * 1e6:.0f}us")
+
+        if scanned != found:
+            sys.exit(f"The scan found {scanned} but the lookup {found}")
+
+
+if __name__ == "__main__":
+    main()
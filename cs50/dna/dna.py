@@ -1,70 +1,342 @@
-from csv import reader, DictReader
+import os
+import mmap
+import glob
+import struct
+import tempfile
+from zlib import crc32
+from array import array
+from csv import reader
+import sys
 from sys import argv
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# the compiled database is stored next to the csv with this suffix
+SUFFIX = '.idx'
+
+# magic, number of strs, people and hash slots, size of the strs, mtime and size of the csv
+HEADER = struct.Struct('<8sIIIIqq')
+MAGIC = b'DNADB\x001\x00'
 
 
 def main():
     if len(argv) < 3:
-        print('Usage: dna.py database.csv sequence.txt')
+        print('Usage: dna.py database.csv sequence.txt [sequence.txt|directory ...]')
         exit(1)
 
+    # several samples or a directory of them are identified together, one line each
+    if len(argv) > 3 or os.path.isdir(argv[2]):
+        # a sample that couldn't be read doesn't stop the others, only the exit status tells
+        if identify_all(argv[1], find_samples(argv[2:])) > 0:
+            exit(1)
+        return
+
+    dna = read_sequence(argv[2])
+
+    with Database.open(argv[1]) as database:
+        # count the longest run of every sequence from the header of the database
+        sequences = longest_runs(dna, database.strs)
+
+        print(database.find(sequences[key] for key in database.strs) or 'No match')
+
+
+def find_samples(paths):
+    # the .txt files of a directory, any other path as it is
+    samples = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            samples.extend(sorted(glob.glob(os.path.join(path, '*.txt'))))
+        else:
+            samples.append(path)
+
+    return samples
+
+
+# the database of a worker process, opened once by open_worker
+worker_database = None
+
+
+def open_worker(filename):
+    global worker_database
+    worker_database = Database.open(filename)
+
+
+def identify(sample):
+    # count and look up one sample with the database of this worker
+    sequences = longest_runs(read_sequence(sample), worker_database.strs)
+    return sample, worker_database.find(sequences[key] for key in worker_database.strs)
+
+
+def identify_all(filename, samples, workers=None):
+    # compile the database once here, so the workers only have to map it
+    Database.open(filename).close()
+    errors = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=open_worker, initargs=(filename,)) as pool:
+        futures = {pool.submit(identify, sample): sample for sample in samples}
+
+        # print every sample as soon as it is done, not in the order they were given
+        for future in as_completed(futures):
+            try:
+                sample, name = future.result()
+            except Exception as e:
+                print(f'{futures[future]} -> error: {e}', file=sys.stderr, flush=True)
+                errors += 1
+                continue
+
+            print(f'{sample} -> {name or "No match"}', flush=True)
+
+    # the number of samples that failed
+    return errors
+
+
+class Database:
+    """
+    A database compiled into a table of STR counts and a hash index on the rows,
+    saved next to the csv and read back with mmap. Without data the compiled file is mapped,
+    with it the compiled bytes are used as they are.
+    """
+
+    def __init__(self, filename, data=None):
+        if data is None:
+            with open(filename, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.mm = data
+
+        try:
+            magic, n_strs, n_people, n_slots, strs_size, self.mtime, self.size = HEADER.unpack_from(self.mm)
+
+            if magic != MAGIC:
+                raise ValueError(f'{filename} is not a compiled dna database')
+
+            if n_slots & (n_slots - 1):
+                raise ValueError(f'{filename} has a broken hash index')
+
+            begin = HEADER.size
+            self.strs = self.mm[begin:begin + strs_size].decode().split('\n') if n_strs else []
+
+            # every part after the strs starts on a multiple of 4, so it can be cast to an array
+            self.names = begin + aligned(strs_size) + 4 * (n_strs * n_people + n_slots + n_people + 1)
+
+            if self.names > len(self.mm):
+                raise ValueError(f'{filename} is truncated')
+        except (ValueError, struct.error):
+            self.release()
+            raise
+
+        view = memoryview(self.mm)
+        begin += aligned(strs_size)
+        self.counts = view[begin:begin + 4 * n_strs * n_people].cast('I')
+        begin += 4 * n_strs * n_people
+        self.slots = view[begin:begin + 4 * n_slots].cast('i')
+        begin += 4 * n_slots
+        self.offsets = view[begin:begin + 4 * (n_people + 1)].cast('I')
+        view.release()
+
+        if self.names + self.offsets[n_people] > len(self.mm):
+            self.close()
+            raise ValueError(f'{filename} is truncated')
+
+    @classmethod
+    def open(cls, filename):
+        """Open the compiled version of a database csv, compiling it first if it is missing or stale."""
+
+        compiled = filename + SUFFIX
+        stat = os.stat(filename)
+
+        if os.path.exists(compiled):
+            try:
+                database = cls(compiled)
+            except (OSError, ValueError, struct.error):
+                # the compiled file is only a cache, a broken one is compiled again
+                database = None
+
+            if database is not None:
+                if (database.mtime, database.size) == (stat.st_mtime_ns, stat.st_size):
+                    return database
+
+                database.close()
+
+        data = compile_database(filename)
+
+        # the compiled file is only a cache, in a directory that can't be written to
+        # the database is used from memory and compiled again next time
+        try:
+            save_database(data, compiled)
+        except OSError:
+            pass
+
+        return cls(compiled, data)
+
+    def find(self, counts):
+        """Return the name of the first person with exactly these counts, in the order of strs, or None."""
+
+        key = array('I', counts)
+        n_strs = len(self.strs)
+
+        if len(key) != n_strs or not self.slots:
+            return None
+
+        row = memoryview(key).cast('B')
+        slot = crc32(row) & (len(self.slots) - 1)
+
+        # linear probing until the row or an empty slot turns up
+        while self.slots[slot] != -1:
+            person = self.slots[slot]
+
+            if self.counts[person * n_strs:(person + 1) * n_strs] == key:
+                return self.name(person)
+
+            slot = (slot + 1) & (len(self.slots) - 1)
+
+        return None
+
+    def name(self, person):
+        begin, end = self.offsets[person], self.offsets[person + 1]
+        return self.mm[self.names + begin:self.names + end].decode()
+
+    def close(self):
+        for view in (self.counts, self.slots, self.offsets):
+            view.release()
+
+        self.release()
+
+    def release(self):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def aligned(size):
+    return (size + 3) & ~3
+
+
+def compile_database(filename):
+    # read the csv once into flat arrays
+    counts, names, offsets = array('I'), bytearray(), array('I', [0])
+
+    with open(filename, newline='') as people_file:
+        rows = reader(people_file)
+        strs = next(rows, ['name'])[1:]
+
+        for row in rows:
+            # blank lines, DictReader skips them too
+            if not row:
+                continue
+
+            # a row of another length would put the counts and the names out of step
+            if len(row) != len(strs) + 1:
+                raise ValueError(f'{filename} line {rows.line_num} has {len(row)} fields instead of {len(strs) + 1}')
+
+            counts.extend(int(count) for count in row[1:])
+            names += row[0].encode()
+            offsets.append(len(names))
+
+    n_strs, n_people = len(strs), len(offsets) - 1
+
+    # a power of two with at least twice as many slots as people, -1 is an empty slot
+    n_slots = 1
+    while n_slots < 2 * n_people:
+        n_slots *= 2
+
+    slots = array('i', [-1]) * n_slots
+    table = memoryview(counts).cast('B')
+    row_size = 4 * n_strs
+
+    for person in range(n_people):
+        row = table[person * row_size:(person + 1) * row_size]
+        slot = crc32(row) & (n_slots - 1)
+
+        while slots[slot] != -1:
+            # the same counts twice, the first person keeps the slot like in the csv scan
+            if table[slots[slot] * row_size:(slots[slot] + 1) * row_size] == row:
+                break
+
+            slot = (slot + 1) & (n_slots - 1)
+        else:
+            slots[slot] = person
+
+    strs_blob = '\n'.join(strs).encode()
+    stat = os.stat(filename)
+
+    return b''.join([
+        HEADER.pack(MAGIC, n_strs, n_people, n_slots, len(strs_blob), stat.st_mtime_ns, stat.st_size),
+        strs_blob.ljust(aligned(len(strs_blob)), b'\0'),
+        counts.tobytes(),
+        slots.tobytes(),
+        offsets.tobytes(),
+        names
+    ])
+
+
+def save_database(data, compiled):
+    # write to a temporary file of its own first, so a reader never sees half a database
+    # and two runs compiling at the same time don't write into the same file
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(compiled) or '.', suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        # mkstemp makes the file readable by its owner only, other users should be able to use it too
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temporary, 0o666 & ~umask)
+
+        os.replace(temporary, compiled)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def read_sequence(filename):
     # read the dna sequence from the file
-    with open(argv[2]) as dna_file:
+    dna_list = []
+
+    with open(filename) as dna_file:
         for row in reader(dna_file):
             dna_list = row
 
+    if not dna_list:
+        raise ValueError(f'{filename} has no sequence')
+
     # store it in a string
-    dna = dna_list[0]
-
-    # create a dictionary where we will store the sequences we intend to count
-    sequences = {}
-
-    # extract the sequences from the database into a list
-    with open(argv[1]) as people_file:
-        for row in reader(people_file):
-            dna_sequences = row
-            dna_sequences.pop(0)
-            break
-
-    # copy the list in a dictionary where the genes are the keys
-    for item in dna_sequences:
-        sequences[item] = 1
-
-    # iterate trough the dna sequence, when it finds repetitions of the values from sequence dictionary it counts them
-    for key in sequences:
-        temp, temp_max, l = 0, 0, len(key)
-        
-        for i in range(len(dna)):
-            
-            # after having counted a sequence it skips at the end of it to avoid counting again
-            while temp > 0:
-                temp -= 1
-                continue
+    return dna_list[0]
+
+
+def longest_run(dna, key):
+    # the length of the run of repeats that ends at every occurrence found so far,
+    # an occurrence only needs the one exactly len(key) before it, so that one is dropped
+    runs = {}
+    longest, l = 0, len(key)
+
+    # hop from one occurrence to the next, overlapping ones included,
+    # so a run that starts inside another one isn't missed
+    i = dna.find(key)
+
+    while i != -1:
+        run = runs.pop(i - l, 0) + 1
+        runs[i] = run
+
+        if run > longest:
+            longest = run
 
-            # if the segment of dna corresponds to the key and there is a repetition of it we start counting
-            if dna[i: i + l] == key:
-                while dna[i - l: i] == dna[i: i + l]:
-                    temp += 1
-                    i += l
+        i = dna.find(key, i + 1)
 
-                # it compares the value to the previous longest sequence and if it is longer it overrides it
-                if temp > temp_max:
-                    temp_max = temp
+    return longest
 
-        # store the longest sequences in the dictionary using the correspondent key
-        sequences[key] += temp_max
 
-    # open and iterate trough the database of people treating each one like a dictionary so it can compare to the sequences one
-    with open(argv[1], newline='') as people_file:
-        for person in DictReader(people_file):
-            
-            # compares the sequences to every person and prints name before leaving the program if there is a match
-            match = sum(sequences[dna] == int(person[dna]) for dna in sequences)
+def longest_runs(dna, keys):
+    # the longest run of consecutive repeats of every key
+    return {key: longest_run(dna, key) for key in keys}
 
-            if match == len(sequences):
-                print(person['name'])
-                exit(0)
 
-        print('No match')
-    
 if __name__ == '__main__':
     main()
@@ -0,0 +1,47 @@
+# Compare the game-by-game simulation with the vectorized one
+
+import sys
+import time
+
+from tournament import read_teams, simulate, simulate_vectorized
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python benchmark.py FILENAME [N]")
+
+    teams = read_teams(sys.argv[1])
+    n = int(sys.argv[2]) if len(sys.argv) == 3 else 100000
+
+    # Import NumPy before measuring
+    simulate_vectorized(teams, 1)
+
+    loop, loop_time = timed(simulate, teams, n)
+    vectorized, vectorized_time = timed(simulate_vectorized, teams, n)
+
+    print(f"{n} tournaments: loop {loop_time:.2f}s, vectorized {vectorized_time:.3f}s, "
+          f"{loop_time / vectorized_time:.0f}x faster")
+
+    # Both estimate the same probabilities, so they should differ by a few standard errors at most
+    worst = 0
+    for team in teams:
+        name = team["team"]
+        p1, p2 = loop.get(name, 0) / n, vectorized.get(name, 0) / n
+        error = ((p1 * (1 - p1) + p2 * (1 - p2)) / n) ** 0.5
+        if error > 0:
+            worst = max(worst, abs(p1 - p2) / error)
+
+    print(f"largest difference: {worst:.1f} standard errors")
+
+    if worst > 5:
+        sys.exit("The estimates don't match")
+
+
+if __name__ == "__main__":
+    main()
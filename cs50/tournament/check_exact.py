@@ -0,0 +1,34 @@
+# Check the exact chances against a large number of simulated tournaments
+
+import sys
+
+from tournament import read_teams, exact_chances, simulate_vectorized
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python check_exact.py FILENAME [N]")
+
+    teams = read_teams(sys.argv[1])
+    n = int(sys.argv[2]) if len(sys.argv) == 3 else 10000000
+
+    exact = exact_chances(teams)
+    counts = simulate_vectorized(teams, n)
+
+    print(f"chances add up to {sum(exact.values()):.12f}")
+
+    # A simulated estimate should be within a few standard errors of the exact chance
+    worst = 0
+    for name, p in exact.items():
+        error = (p * (1 - p) / n) ** 0.5
+        if error > 0:
+            worst = max(worst, abs(counts.get(name, 0) / n - p) / error)
+
+    print(f"{n} tournaments, largest difference: {worst:.1f} standard errors")
+
+    if worst > 5 or abs(sum(exact.values()) - 1) > 1e-9:
+        sys.exit("The exact chances don't match the simulation")
+
+
+if __name__ == "__main__":
+    main()
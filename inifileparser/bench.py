@@ -0,0 +1,107 @@
+"""
+Compares parse_ini_file with the single-pass parse_ini and parse_ini_nested on a generated flat file,
+after checking parse_ini_nested on a few nested files and LazyIni against load on a few flat ones.
+Usage: python bench.py [sections] [keys per section]
+"""
+
+import os
+import shutil
+import tempfile
+from sys import argv
+from time import perf_counter
+
+from main import parse_ini_file, parse_ini_nested, load, load_nested
+from lazy import LazyIni
+
+
+# nested files and what parse_ini_nested should make of them
+NESTED = [
+    ('[a]\nx = 1\n[a.b]\ny = 2\n', {'a': {'x': '1', 'b': {'y': '2'}}}),
+    ('[a]\n  [b]\n  y = 2\n', {'a': {'b': {'y': '2'}}}),
+    # a redefined section drops its old properties but keeps its subsections
+    ('[a]\nx = 1\n[a.b]\ny = 1\n[a]\nw = 4\n', {'a': {'b': {'y': '1'}, 'w': '4'}}),
+    ('[a]\nx = 1 \\\n  2\n', {'a': {'x': '1 2'}}),
+]
+
+
+# flat files LazyIni has to read like load does
+FLAT = [
+    '[a]\nx=1\n[b]\n[c]\nz=3',
+    '; comment\n[a]\n[b]\n\n[c]\nz = 3\n',
+    '[a]\r\nx = 1\r\n[b]\r\n[c]\r\nz = 3\r\n',
+    '[a]\n',
+    '',
+]
+
+
+def check_lazy():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'flat.ini')
+
+    try:
+        for text in FLAT:
+            with open(path, 'w', newline='') as f:
+                f.write(text)
+
+            expected = load(path)
+
+            # the first open scans the file and saves the .idx, the second one reads it back
+            for _ in range(2):
+                with LazyIni(path) as lazy:
+                    result = {name: dict(lazy[name]) for name in lazy}
+
+                assert result == expected, f'{text!r} gave {result}, expected {expected}'
+
+            os.remove(path + '.idx')
+    finally:
+        shutil.rmtree(directory)
+
+
+def check_nested():
+    for text, expected in NESTED:
+        result = parse_ini_nested(text.splitlines(keepends=True))
+        assert result == expected, f'{text!r} gave {result}, expected {expected}'
+
+
+def generate(path: str, sections: int, keys: int):
+    with open(path, 'w') as f:
+        for i in range(sections):
+            f.write(f'; section number {i}\n[Section{i}]\n')
+
+            for j in range(keys):
+                f.write(f'  Key{j} = value {i * keys + j}\n')
+
+            f.write('\n')
+
+
+def measure(name: str, func, path: str):
+    start = perf_counter()
+    result = func(path)
+    print(f'{name:>16}: {perf_counter() - start:.3f}s')
+
+    return result
+
+
+def main():
+    sections = int(argv[1]) if len(argv) > 1 else 10000
+    keys = int(argv[2]) if len(argv) > 2 else 5
+
+    check_nested()
+    check_lazy()
+
+    fd, path = tempfile.mkstemp(suffix='.ini')
+    os.close(fd)
+
+    try:
+        generate(path, sections, keys)
+        print(f'{sections} sections, {keys} keys each, {os.path.getsize(path)} bytes')
+
+        expected = measure('parse_ini_file', parse_ini_file, path)
+        assert measure('parse_ini', load, path) == expected
+        assert measure('parse_ini_nested', load_nested, path) == expected
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from main import load
+
+
+class Entry:
+    __slots__ = ('version', 'size', 'config')
+
+    def __init__(self, version: tuple[int, int], config: dict):
+        self.version = version
+        self.size = version[1]
+        self.config = config
+
+
+def file_version(path: str) -> tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ConfigCache:
+    """
+    Parsed INI files shared between threads, keyed by path, mtime and size.
+    Only one thread parses a file at a time, the others wait for its result. The least recently used
+    files are dropped when there are more than max_files of them or their total size exceeds max_bytes.
+    The returned dicts are shared, so they must not be modified.
+    """
+
+    def __init__(self, max_files=128, max_bytes=64 << 20, loader: Callable[[str], dict] = load):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.loader = loader
+
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, Entry] = OrderedDict()
+        self.loading: dict[str, threading.Event] = {}
+        self.size = 0
+        self.watcher = None
+
+    def get(self, filename: str) -> dict[str, dict[str, str]]:
+        path = os.path.abspath(filename)
+
+        # a watcher keeps the entries fresh, otherwise every call checks the file
+        version = None if self.watcher else file_version(path)
+
+        with self.lock:
+            entry = self.entries.get(path)
+
+            if entry is not None and (version is None or entry.version == version):
+                self.entries.move_to_end(path)
+                return entry.config
+
+            event = self.loading.get(path)
+            is_owner = event is None
+
+            if is_owner:
+                event = self.loading[path] = threading.Event()
+
+        if not is_owner:
+            event.wait()
+            return self.get(filename)
+
+        try:
+            return self.reload(path)
+        finally:
+            with self.lock:
+                del self.loading[path]
+
+            event.set()
+
+    def reload(self, path: str) -> dict[str, dict[str, str]]:
+        # the version is taken first, so a change during parsing is noticed the next time
+        version = file_version(path)
+        config = self.loader(path)
+
+        with self.lock:
+            self.remove(path)
+
+            self.entries[path] = Entry(version, config)
+            self.size += version[1]
+
+            while len(self.entries) > self.max_files or (self.size > self.max_bytes and len(self.entries) > 1):
+                self.remove(next(iter(self.entries)))
+
+        return config
+
+    def remove(self, path: str):
+        entry = self.entries.pop(path, None)
+
+        if entry is not None:
+            self.size -= entry.size
+
+    def invalidate(self, filename: str):
+        with self.lock:
+            self.remove(os.path.abspath(filename))
+
+    def watch(self, interval=1.0) -> 'Watcher':
+        """Starts a thread that reparses the changed files every `interval` seconds instead of checking them on get()."""
+
+        if self.watcher is None:
+            self.watcher = Watcher(self, interval)
+            self.watcher.start()
+
+        return self.watcher
+
+    def unwatch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+
+class Watcher(threading.Thread):
+    """Polls the files of a ConfigCache and reparses the ones that changed."""
+
+    def __init__(self, cache: ConfigCache, interval: float):
+        super().__init__(daemon=True)
+        self.cache = cache
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        with self.cache.lock:
+            versions = {path: entry.version for path, entry in self.cache.entries.items()}
+
+        for path, version in versions.items():
+            try:
+                if file_version(path) != version:
+                    self.cache.reload(path)
+            except (OSError, SyntaxError):
+                # a removed or broken file is parsed again, and fails, on the next get()
+                self.cache.invalidate(path)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from main import load
+
+
+def merge(layers: list[tuple[str, dict[str, dict[str, str]]]]) -> tuple[dict, dict]:
+    """
+    Merges parsed files key by key, a later file overrides the keys of an earlier one.
+    Returns the merged config and {section: {key: filename}} with the file every final key came from.
+    """
+
+    config = {}
+    origins = {}
+
+    for filename, sections in layers:
+        for name, props in sections.items():
+            config.setdefault(name, {}).update(props)
+            origins.setdefault(name, {}).update(dict.fromkeys(props, filename))
+
+    return config, origins
+
+
+# below this many bytes in total starting processes costs more than parsing the files one by one
+PROCESS_THRESHOLD = 1 << 20
+
+
+def load_layers(filenames: list[str], workers: int | None = None, processes: bool | None = None,
+                missing_ok=False) -> tuple[dict, dict]:
+    """
+    Parses the files and merges them with merge(), in the order they're given (defaults first,
+    overrides last). Parsing is pure Python and holds the GIL, so only processes parse in parallel.
+    By default they're used once the files add up to PROCESS_THRESHOLD and there is more than one
+    worker, otherwise the files are parsed right here. processes=False uses threads, they only help when reading the files is the slow part.
+    """
+
+    if missing_ok:
+        filenames = [filename for filename in filenames if os.path.exists(filename)]
+
+    if not filenames:
+        return {}, {}
+
+    workers = min(workers or os.cpu_count() or 1, len(filenames))
+
+    if processes is None:
+        if workers == 1 or sum(os.path.getsize(filename) for filename in filenames) < PROCESS_THRESHOLD:
+            return merge([(filename, load(filename)) for filename in filenames])
+
+        processes = True
+
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+
+    with executor(workers) as pool:
+        # map keeps the order, so the precedence doesn't depend on which file is parsed first
+        return merge(list(zip(filenames, pool.map(load, filenames))))
@@ -0,0 +1,131 @@
+import os
+import re
+import json
+import mmap
+from collections.abc import Mapping
+
+from main import parse_ini, parse_props
+
+
+# a line starting with '[' up to its line break, a comment can't start with it;
+# a line break in front lets the regex engine look for it quickly, the first line is matched on its own.
+# the line break after a header isn't matched, it is the one in front of a header right below it
+HEADER = rb'[ \t\r]*\[([^\]\n]*)(\]?)[^\n]*'
+FIRST_HEADER = re.compile(HEADER)
+NEXT_HEADER = re.compile(b'\n' + HEADER)
+INDEX_SUFFIX = '.idx'
+
+
+class LazyIni(Mapping):
+    """
+    A read-only mapping of the sections of an INI file that parses a section on its first access.
+    Opening the file only records where each [<name>] header is, and that index is saved
+    next to the file as <filename>.idx, so the next open of the unchanged file doesn't scan it at all.
+    """
+
+    def __init__(self, filename: str, save_index=True, encoding='utf-8'):
+        self.filename = filename
+        self.encoding = encoding
+        self.cache = {}
+
+        self.file = open(filename, 'rb')
+        stat = os.fstat(self.file.fileno())
+
+        # an empty file can't be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size > 0 else b''
+        self.sections = self.load_index(stat)
+
+        if self.sections is None:
+            self.sections = self.scan()
+
+            if save_index:
+                self.save_index(stat)
+
+    def scan(self) -> dict[str, tuple[int, int]]:
+        """Returns the byte offsets of the body of every section."""
+
+        sections = {}
+        last = None
+
+        first = FIRST_HEADER.match(self.data)
+        headers = NEXT_HEADER.finditer(self.data)
+
+        for match in [first] + list(headers) if first else headers:
+            # the line break in front of a header belongs to the previous section
+            start = match.start() if match is first else match.start() + 1
+
+            if not match.group(2):
+                raise SyntaxError(f'expected \']\' to close the section name but got '
+                                  f'{self.data[start:match.end()].decode(self.encoding).strip()}')
+
+            if last is None:
+                # only comments and empty lines may come before the first section
+                parse_ini(self.data[:start].decode(self.encoding).splitlines(True))
+            else:
+                sections[last[0]] = (last[1], start)
+
+            # the body starts after the line break of the header
+            last = (match.group(1).decode(self.encoding), min(match.end() + 1, len(self.data)))
+
+        if last is None:
+            parse_ini(self.data[:].decode(self.encoding).splitlines(True))
+        else:
+            sections[last[0]] = (last[1], len(self.data))
+
+        return sections
+
+    def index_path(self) -> str:
+        return self.filename + INDEX_SUFFIX
+
+    def load_index(self, stat: os.stat_result) -> dict[str, tuple[int, int]] | None:
+        try:
+            with open(self.index_path(), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if index.get('size') != stat.st_size or index.get('mtime') != stat.st_mtime_ns:
+            return None
+
+        return {name: (start, end) for name, start, end in index['sections']}
+
+    def save_index(self, stat: os.stat_result):
+        index = {
+            'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+            'sections': [[name, start, end] for name, (start, end) in self.sections.items()]
+        }
+
+        # the directory may be read-only, the index is only an optimization
+        try:
+            with open(self.index_path(), 'w') as f:
+                f.write(json.dumps(index))
+        except OSError:
+            pass
+
+    def __getitem__(self, name: str) -> dict[str, str]:
+        if name not in self.cache:
+            start, end = self.sections[name]
+            self.cache[name] = parse_props(self.data[start:end].decode(self.encoding).splitlines(True))
+
+        return self.cache[name]
+
+    def __iter__(self):
+        return iter(self.sections)
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def __contains__(self, name) -> bool:
+        return name in self.sections
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,4 +1,10 @@
+import re
+from typing import Iterable
+
+
 SPACES = [' ', '\t', '\n', '\r']
+WHITESPACES = ''.join(SPACES)
+COMMENTS = (';', '#')
 
 
 def read_file(filename: str) -> list[str]:
@@ -14,7 +20,7 @@ def skip_whitespaces(line, index) -> int:
     return index if index < len(line) else -1
 
 def is_comment(line, index) -> int:
-    return line[index] in (';', '#')
+    return line[index] in COMMENTS
 
 
 def parse_section(lines: list[str], index):
@@ -76,9 +82,218 @@ def parse_ini_file(filename):
     return sections
         
 
+def parse_ini(lines: Iterable[str]) -> dict[str, dict[str, str]]:
+    """
+    Single-pass version of parse_ini_file that takes a file object or any other iterable of lines,
+    so a file is never held in memory as a list.
+    """
+
+    sections = {}
+    props = None
+
+    for line in lines:
+        # the same as read_file, only the line break is dropped
+        if line and line[-1] in SPACES:
+            line = line[:-1]
+
+        stripped = line.lstrip(WHITESPACES)
+
+        if not stripped or stripped[0] in COMMENTS:
+            continue
+
+        if stripped[0] == '[':
+            name_end = stripped.find(']')
+
+            if name_end == -1:
+                raise SyntaxError(f'expected \']\' to close the section name but got {stripped}')
+
+            props = sections[stripped[1:name_end]] = {}
+            continue
+
+        if props is None:
+            raise SyntaxError(f'expected a section name: [<name>], but got \'{stripped}\'')
+
+        add_property(props, stripped)
+
+    return sections
+
+
+def add_property(props: dict[str, str], stripped: str):
+    eq_pos = stripped.find('=')
+
+    if eq_pos == -1:
+        raise SyntaxError(f'expected \'=\' to occur in <name>=<value> but got {stripped}')
+
+    if eq_pos + 1 >= len(stripped):
+        raise SyntaxError(f'expected a value after \'=\' but got {stripped}')
+
+    props[stripped[:eq_pos].strip()] = stripped[eq_pos+1:].strip()
+
+
+def parse_props(lines: Iterable[str]) -> dict[str, str]:
+    """Parses the body of a single section, the lines after its [<name>] header."""
+
+    props = {}
+
+    for line in lines:
+        stripped = line.rstrip('\n').lstrip(WHITESPACES)
+
+        if stripped and stripped[0] not in COMMENTS:
+            add_property(props, stripped)
+
+    return props
+
+
+# a line of the nested grammar: a header with its indentation, a property, or a comment/empty line
+LINE = re.compile(r'''
+    (?P<indent>[ \t]*)(?:
+        \[(?P<section>[^\]]*)(?P<closed>\]?).*
+      | (?P<skip>[;\#].*|\r?)
+      | (?P<key>[^=]*)=(?P<value>.*)
+    )\Z''', re.VERBOSE | re.DOTALL)
+
+ESCAPE = re.compile(r'\\(.)')
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0', '\\': '\\', ';': ';', '#': '#', '=': '=', '"': '"', "'": "'"}
+
+# the states of parse_ini_nested
+LINE_START, CONTINUATION = 0, 1
+
+
+def unescape(value: str) -> str:
+    # unknown escapes are left as they are, so a lone backslash (C:\dir) survives
+    return ESCAPE.sub(lambda m: ESCAPES.get(m.group(1), m.group(0)), value) if '\\' in value else value
+
+
+def ends_with_continuation(value: str) -> bool:
+    # an odd number of trailing backslashes, an even one is only escaped backslashes
+    return (len(value) - len(value.rstrip('\\'))) % 2 == 1
+
+
+def parse_ini_nested(lines: Iterable[str]) -> dict:
+    """
+    parse_ini with nested sections and escapes, still in one pass.
+    [a.b] is the subsection b of a, and so is a header indented deeper than the previous one.
+    Values understand \\n, \\t, \\r, \\0, \\\\, \\;, \\#, \\=, \\" and \\', and a backslash
+    at the end of a line continues the value on the next one.
+    """
+
+    root = {}
+    defined = set()
+    headers = []
+    props = None
+
+    state = LINE_START
+    key, parts = None, []
+
+    for line in lines:
+        if line and line[-1] == '\n':
+            line = line[:-1]
+
+        if state == CONTINUATION:
+            part = line.strip()
+
+            if ends_with_continuation(part):
+                parts.append(part[:-1])
+                continue
+
+            parts.append(part)
+            props[key] = unescape(''.join(parts))
+
+            state = LINE_START
+            continue
+
+        match = LINE.match(line)
+
+        if match is None:
+            raise SyntaxError(f'expected \'=\' to occur in <name>=<value> but got {line.strip()}')
+
+        if match.group('skip') is not None:
+            continue
+
+        if match.group('section') is not None:
+            if not match.group('closed'):
+                raise SyntaxError(f'expected \']\' to close the section name but got {line.strip()}')
+
+            names = [name.strip() for name in match.group('section').split('.')]
+
+            if '' in names:
+                raise SyntaxError(f'expected a section name between the dots but got {line.strip()}')
+
+            indent = len(match.group('indent'))
+
+            # the headers that aren't indented less than this one are not its parents
+            while headers and headers[-1][0] >= indent:
+                headers.pop()
+
+            path = (headers[-1][1] if headers else ()) + tuple(names)
+            headers.append((indent, path))
+
+            props = section(root, path, path in defined)
+            defined.add(path)
+            continue
+
+        if props is None:
+            raise SyntaxError(f'expected a section name: [<name>], but got \'{line.strip()}\'')
+
+        key = match.group('key').strip()
+        value = match.group('value').strip()
+
+        if not match.group('value'):
+            raise SyntaxError(f'expected a value after \'=\' but got {line.strip()}')
+
+        if isinstance(props.get(key), dict):
+            raise SyntaxError(f'property {key} has the same name as a subsection')
+
+        if ends_with_continuation(value):
+            state, parts = CONTINUATION, [value[:-1]]
+            continue
+
+        props[key] = unescape(value)
+
+    if state == CONTINUATION:
+        props[key] = unescape(''.join(parts))
+
+    return root
+
+
+def section(root: dict, path: tuple[str, ...], redefined: bool) -> dict:
+    node = root
+
+    for name in path[:-1]:
+        node = node.setdefault(name, {})
+
+        if not isinstance(node, dict):
+            raise SyntaxError(f'section {".".join(path)} has the same name as a property')
+
+    if not isinstance(node.get(path[-1], {}), dict):
+        raise SyntaxError(f'section {".".join(path)} has the same name as a property')
+
+    if path[-1] not in node:
+        node[path[-1]] = {}
+    elif redefined:
+        # the same as parse_ini, a section declared twice keeps only the properties of the last one,
+        # but the subsections parsed into it stay
+        props = node[path[-1]]
+
+        for key in [key for key, value in props.items() if not isinstance(value, dict)]:
+            del props[key]
+
+    return node[path[-1]]
+
+
+def load(filename) -> dict[str, dict[str, str]]:
+    with open(filename, 'r') as f:
+        return parse_ini(f)
+
+
+def load_nested(filename) -> dict:
+    with open(filename, 'r') as f:
+        return parse_ini_nested(f)
+
+
 def main():
     from sys import argv
-    print(parse_ini_file(argv[1]))
+    print(load(argv[1]))
 
 
 if __name__ == '__main__':
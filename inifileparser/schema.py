@@ -0,0 +1,126 @@
+import re
+import keyword
+from collections import namedtuple
+from fnmatch import fnmatchcase
+from typing import Any, Callable
+
+from main import parse_ini
+
+
+BOOLEANS = {'true': True, 'yes': True, 'on': True, '1': True, 'false': False, 'no': False, 'off': False, '0': False}
+
+# a field without a default has to be in the file
+REQUIRED = object()
+
+
+def to_bool(value: str) -> bool:
+    try:
+        return BOOLEANS[value.lower()]
+    except KeyError:
+        raise ValueError(f'expected a boolean but got {value}') from None
+
+
+def to_identifier(key: str) -> str:
+    name = re.sub(r'\W', '_', key)
+
+    # namedtuple fields can't start with a digit or an underscore (2nd -> f_2nd) or be keywords (class -> class_)
+    if not name or name[0].isdigit() or name[0] == '_':
+        return 'f_' + name
+
+    return name + '_' if keyword.iskeyword(name) else name
+
+
+class SectionSchema:
+    """
+    The fields of a section: {key: type} or {key: (type, default)}. A section is converted
+    into a namedtuple once, with the keys turned into identifiers (max-size -> max_size).
+    """
+
+    def __init__(self, name: str, fields: dict[str, Callable | tuple[Callable, Any]], strict=False):
+        self.name = name
+        self.strict = strict
+        self.fields = []
+        self.keys = set(fields)
+        identifiers = {}
+
+        for key, spec in fields.items():
+            convert, default = spec if isinstance(spec, tuple) else (spec, REQUIRED)
+            self.fields.append((key, to_bool if convert is bool else convert, default))
+
+            identifier = to_identifier(key)
+
+            if identifier in identifiers:
+                raise ValueError(f'[{name}] keys {identifiers[identifier]} and {key} are both the field {identifier}')
+
+            identifiers[identifier] = key
+
+        self.record = namedtuple(to_identifier(name), identifiers)
+
+    def convert(self, section: str, props: dict[str, str]) -> tuple:
+        values = []
+
+        for key, convert, default in self.fields:
+            value = props.get(key)
+
+            if value is None:
+                if default is REQUIRED:
+                    raise ValueError(f'[{section}] is missing {key}')
+
+                values.append(default)
+                continue
+
+            try:
+                values.append(convert(value))
+            except ValueError as e:
+                raise ValueError(f'[{section}] {key}: {e}') from None
+
+        if self.strict:
+            unknown = set(props) - self.keys
+
+            if unknown:
+                raise ValueError(f'[{section}] has unknown keys: {", ".join(sorted(unknown))}')
+
+        return self.record._make(values)
+
+
+class Schema:
+    """
+    Section schemas by section name, a name can be an fnmatch pattern like 'Server*' to describe
+    many sections of the same shape. Sections that match nothing stay dicts unless strict is set.
+    """
+
+    def __init__(self, sections: dict[str, dict[str, Callable | tuple[Callable, Any]]], strict=False):
+        self.strict = strict
+        self.sections = [(pattern, SectionSchema(pattern, fields, strict)) for pattern, fields in sections.items()]
+        self.resolved = {}
+
+    def find(self, section: str) -> SectionSchema | None:
+        if section not in self.resolved:
+            # an exact name wins over the patterns
+            exact = [schema for pattern, schema in self.sections if pattern == section]
+            matches = exact or [schema for pattern, schema in self.sections if fnmatchcase(section, pattern)]
+
+            self.resolved[section] = matches[0] if matches else None
+
+        return self.resolved[section]
+
+    def convert(self, config: dict[str, dict[str, str]]) -> dict[str, Any]:
+        typed = {}
+
+        for section, props in config.items():
+            schema = self.find(section)
+
+            if schema is None:
+                if self.strict:
+                    raise ValueError(f'[{section}] is not described by the schema')
+
+                typed[section] = props
+            else:
+                typed[section] = schema.convert(section, props)
+
+        return typed
+
+
+def load_typed(filename, schema: Schema) -> dict[str, Any]:
+    with open(filename, 'r') as f:
+        return schema.convert(parse_ini(f))